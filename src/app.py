@@ -1,31 +1,97 @@
+import os
 import re
-from io import BytesIO
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO, StringIO
+from itertools import repeat
 
 import streamlit as st
 import pdfplumber
 import pandas as pd
-from openpyxl.styles import Border, Side, PatternFill, Font
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Border, Side, PatternFill, Font, NamedStyle
+from pdfminer.high_level import extract_text as pdfminer_extract_text
+
+# Los workers del pool tienen que vivir en un módulo importable (no en este
+# script de Streamlit): se reutilizan los del CLI de ECI
+from eci_parser import _extract_pages_text, page_ranges
+
+
+# ============= LECTURA DE PDF =============
+
+# "pdfplumber" (por defecto) o "pdfminer": pdfminer.six a pelo es más rápido
+# porque no construye el modelo de chars/rects de pdfplumber, pero agrupa el
+# texto por bloques y puede desordenar líneas en PDFs con columnas.
+PDF_TEXT_BACKEND = os.environ.get("EDIWIN_PDF_BACKEND", "pdfplumber")
+
+# Procesos para extraer el texto con pdfplumber (por defecto, uno por núcleo;
+# 1 = en serie). extract_text es CPU puro: con hilos el GIL no escala.
+PDF_WORKERS = int(os.environ.get("EDIWIN_PDF_WORKERS", "0")) or os.cpu_count() or 1
+
+BLANK_LINES_RE = re.compile(r"\n\s*\n")
+
+
+def iter_pages_text(pdf_bytes: bytes):
+    """
+    Devuelve (generador) el texto de cada página del PDF.
+    """
+    if PDF_TEXT_BACKEND == "pdfminer":
+        # pdfminer separa las páginas con \f y los bloques con líneas vacías
+        text = pdfminer_extract_text(BytesIO(pdf_bytes))
+        for page_text in text.split("\f"):
+            yield BLANK_LINES_RE.sub("\n", page_text)
+    else:
+        with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+            n_pages = len(pdf.pages)
+            if PDF_WORKERS == 1 or n_pages <= 1:
+                for page in pdf.pages:
+                    yield page.extract_text() or ""
+                return
+
+        # Un tramo contiguo de páginas por proceso, en orden
+        ranges = page_ranges(n_pages, min(PDF_WORKERS, n_pages))
+        with ProcessPoolExecutor(max_workers=len(ranges)) as ex:
+            for texts in ex.map(_extract_pages_text, repeat(pdf_bytes), ranges):
+                yield from texts
 
 
 # ============= PARSER EUROFIEL =============
 
+ORDER_START_RE = re.compile(r"Nº Pedido\s*:")
+NEWLINE_RE = re.compile(r"\n")
+
+# Cabecera del pedido. Se buscan campo a campo a propósito: cada patrón
+# empieza por un literal y `re` salta directo a él, mientras que una sola
+# alternativa con todos los campos prueba cada posición del texto
+# (medido: ~70x más lenta en un pedido típico).
+EUROFIEL_PEDIDO_RE = re.compile(r"Nº Pedido\s*:\s*(\S+)")
+EUROFIEL_FECHA_ENTREGA_RE = re.compile(r"Fecha Entrega\s*:\s*(\d{2}/\d{2}/\d{4})")
+EUROFIEL_PAIS_RE = re.compile(r"País:\s*\([^)]*\)\s*([A-ZÁÉÍÓÚÜÑ ]+)")
+EUROFIEL_DESCRIPCION_RE = re.compile(r"Descripción:\s*(.+)")
+EUROFIEL_TOTAL_UNIDADES_RE = re.compile(r"Total Unidades\s+(\d+)")
+
+
 def split_orders(full_text: str):
     """
     Divide el texto completo del PDF en bloques,
     cada uno correspondiente a un pedido (PEDIDO / REEMPLAZO / ANULACIÓN).
     """
-    matches = list(re.finditer(r"Nº Pedido\s*:", full_text))
+    # Sin ningún "Nº Pedido" no hay pedidos: evitamos recorrer el texto
+    if "Nº Pedido" not in full_text:
+        return []
+
+    matches = list(ORDER_START_RE.finditer(full_text))
     chunks = []
 
+    # Posiciones de los saltos de línea (-1 hace de "inicio del texto")
+    nl_positions = [-1] + [m.start() for m in NEWLINE_RE.finditer(full_text)]
+
     for i, m in enumerate(matches):
         start = m.start()
         # Buscamos la línea anterior para incluir el TIPO (PEDIDO, ANULACIÓN PEDIDO…)
-        prev_nl = full_text.rfind("\n", 0, start)
-        if prev_nl != -1:
-            prev_prev_nl = full_text.rfind("\n", 0, prev_nl)
-            order_start = prev_prev_nl + 1 if prev_prev_nl != -1 else 0
-        else:
-            order_start = 0
+        k = bisect_left(nl_positions, start)
+        order_start = nl_positions[k - 2] + 1 if k >= 2 else 0
 
         end = matches[i + 1].start() if i + 1 < len(matches) else len(full_text)
         chunk = full_text[order_start:end].strip()
@@ -34,6 +100,25 @@ def split_orders(full_text: str):
     return chunks
 
 
+def strip_size(code: str) -> str:
+    """
+    Quita la talla final (/XS, /01...) de un código: lo mismo que
+    re.sub(r"/[^/]+$", "", code), pero con rpartition (sin regex).
+    """
+    head, sep, size = code.rpartition("/")
+    return head if sep and size else code
+
+
+def is_cli_code(token: str) -> bool:
+    """
+    Cod Cliente/Color/Talla (0863769/66/01): tres grupos de dígitos.
+    """
+    if "/" not in token:
+        return False
+    groups = token.split("/")
+    return len(groups) == 3 and all(g.isdecimal() for g in groups)
+
+
 def parse_detail_line_eurofiel(line: str):
     """
     Parsea una línea de detalle de artículo Eurofiel.
@@ -49,12 +134,12 @@ def parse_detail_line_eurofiel(line: str):
     if not parts[0].isdigit():
         return None
 
-    if not re.fullmatch(r"\d{13}", parts[1]):
+    if len(parts[1]) != 13 or not parts[1].isdecimal():  # EAN13
         return None
 
     cli_idx = None
     for i in range(2, len(parts)):
-        if re.fullmatch(r"\d+/\d+/\d+", parts[i]):
+        if is_cli_code(parts[i]):
             cli_idx = i
             break
 
@@ -67,9 +152,9 @@ def parse_detail_line_eurofiel(line: str):
     p_neto = parts[cli_idx + 3]
 
     # MODELO = Cod Proveedor/Color (quitamos talla)
-    modelo = re.sub(r"/[^/]+$", "", cod_prov_full)
+    modelo = strip_size(cod_prov_full)
     # PATRON = Cod Cliente/Color (quitamos talla)
-    patron = re.sub(r"/[^/]+$", "", cod_cli_full)
+    patron = strip_size(cod_cli_full)
 
     precio = p_neto.replace(",", ".")
 
@@ -84,20 +169,16 @@ def parse_order_eurofiel(order_text: str):
     first_line = lines[0].strip() if lines else ""
     tipo = first_line  # PEDIDO / REEMPLAZO PEDIDO / ANULACIÓN PEDIDO
 
-    def search(pattern: str):
-        m = re.search(pattern, order_text)
+    def search(pattern: re.Pattern):
+        m = pattern.search(order_text)
         return m.group(1).strip() if m else ""
 
-    pedido = search(r"Nº Pedido\s*:\s*(\S+)")
-    fecha_entrega = search(r"Fecha Entrega\s*:\s*(\d{2}/\d{2}/\d{4})")
+    pedido = search(EUROFIEL_PEDIDO_RE)
+    fecha_entrega = search(EUROFIEL_FECHA_ENTREGA_RE)
 
-    pais = ""
-    m_pais = re.search(r"País:\s*\([^)]*\)\s*([A-ZÁÉÍÓÚÜÑ ]+)", order_text)
-    if m_pais:
-        pais = m_pais.group(1).strip()
-
-    descripcion = search(r"Descripción:\s*(.+)")
-    total_unidades = search(r"Total Unidades\s+(\d+)")
+    pais = search(EUROFIEL_PAIS_RE)
+    descripcion = search(EUROFIEL_DESCRIPCION_RE)
+    total_unidades = search(EUROFIEL_TOTAL_UNIDADES_RE)
 
     modelo = ""
     patron = ""
@@ -122,12 +203,19 @@ def parse_order_eurofiel(order_text: str):
     }
 
 
+@st.cache_data(show_spinner=False, max_entries=8)
 def parse_pdf_eurofiel_bytes(pdf_bytes: bytes):
     """
     Parsea un PDF Eurofiel que viene en memoria (subido por web).
     """
-    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-        full_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+    # Volcamos cada página en un único buffer en vez de acumular una
+    # lista de textos y unirla al final
+    buf = StringIO()
+    for i, page_text in enumerate(iter_pages_text(pdf_bytes)):
+        if i:
+            buf.write("\n")
+        buf.write(page_text)
+    full_text = buf.getvalue()
 
     orders = split_orders(full_text)
     rows = [parse_order_eurofiel(o) for o in orders]
@@ -137,74 +225,106 @@ def parse_pdf_eurofiel_bytes(pdf_bytes: bytes):
 
 # ============= PARSER ECI =============
 
+TIPO_RE = re.compile(
+    r"^[^\S\n]*(pedido|reposici[oó]n|anulaci[oó]n pedido)[^\S\n]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+PEDIDO_RE = re.compile(r"Nº Pedido\s+(\d+)")
+DEPARTAMENTO_RE = re.compile(r"Dpto\. venta\s+(\d+)")
+FECHA_ENTREGA_RE = re.compile(r"Fecha Entrega\s+(\d{2}/\d{2}/\d{4})")
+SUC_DESTINO_RE = re.compile(r"Sucursal Destino que Pide\s+([0-9 ]+)\s+[A-ZÁÉÍÓÚÜÑ]")
+SUC_ENTREGA_RE = re.compile(r"Sucursal de Entrega\s+([0-9 ]+)\s+[A-ZÁÉÍÓÚÜÑ]")
+
+ITEM_LINE_RE = re.compile(r"^(?:\d+\s+\d{13}|[A-Z0-9]{5,}\s+\d{3})\s")
+# Los 6 últimos tokens numéricos, con o sin palabras entre ellos (ver eci_parser)
+TEXT_TOKENS = r"(?:\s+[\d.,]*[^\d.,\s]\S*)*"
+DETAIL_FIELDS_RE = re.compile(
+    r"^\d+\s+\d{13}(?=\s)(?P<mid>.*?)"
+    rf"\s+(?P<qty>[\d.,]+){TEXT_TOKENS}\s+[\d.,]+{TEXT_TOKENS}\s+(?P<pbruto>[\d.,]+)"
+    rf"(?:{TEXT_TOKENS}\s+[\d.,]+){{3}}{TEXT_TOKENS}\s*$"
+)
+MODEL_CODE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+ECI_COLUMNS = [
+    "TIPO",
+    "N_PEDIDO",
+    "DEPARTAMENTO",
+    "FECHA_ENTREGA",
+    "SUC_ENTREGA",
+    "DESCRIPCION",
+    "MODELO",
+    "COLOR",
+    "PRECIO",
+    "TOTAL_UNIDADES",
+]
+
+# Columnas que se repiten en muchas filas (cabecera de página, pedido y
+# precio): como category ocupan un código entero por fila
+CATEGORY_COLS = [
+    "TIPO",
+    "N_PEDIDO",
+    "DEPARTAMENTO",
+    "FECHA_ENTREGA",
+    "SUC_ENTREGA",
+    "PRECIO",
+]
+
+
 def parse_page_eci(text: str):
     """
     Parsea una página de pedido de ECI.
-    Devuelve una lista de dicts, una fila por (pedido, modelo, color).
+    Devuelve un dict columna → lista de valores (ECI_COLUMNS),
+    con una posición por (pedido, modelo, color).
     """
 
     # Limpiamos líneas
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    lines = [ln for ln in map(str.strip, text.splitlines()) if ln]
 
-    def search(pattern: str):
-        m = re.search(pattern, text)
+    def search(pattern: re.Pattern):
+        m = pattern.search(text)
         return m.group(1).strip() if m else ""
 
     # TIPO: Pedido / Reposición / Anulación Pedido...
-    tipo = ""
-    for ln in lines:
-        low = ln.lower()
-        if low in ("pedido", "reposicion", "reposición", "anulacion pedido", "anulación pedido"):
-            tipo = ln.upper()
-            break
+    m_tipo = TIPO_RE.search(text)
+    tipo = m_tipo.group(1).upper() if m_tipo else ""
 
     # Cabecera
-    n_pedido = search(r"Nº Pedido\s+(\d+)")
-    departamento = search(r"Dpto\. venta\s+(\d+)")
-    fecha_entrega = search(r"Fecha Entrega\s+(\d{2}/\d{2}/\d{4})")
+    n_pedido = search(PEDIDO_RE)
+    departamento = search(DEPARTAMENTO_RE)
+    fecha_entrega = search(FECHA_ENTREGA_RE)
 
     # Sucursal entrega (01 0050, 02 0062, etc.)
-    suc_entrega = search(r"Sucursal Destino que Pide\s+([0-9 ]+)\s+[A-ZÁÉÍÓÚÜÑ]")
+    suc_entrega = search(SUC_DESTINO_RE)
     if not suc_entrega:
-        suc_entrega = search(r"Sucursal de Entrega\s+([0-9 ]+)\s+[A-ZÁÉÍÓÚÜÑ]")
+        suc_entrega = search(SUC_ENTREGA_RE)
 
-    rows = []
+    # Columnas de detalle: una lista por campo
+    descripciones = []
+    modelos = []
+    colores = []
+    precios = []
+    unidades = []
 
     for i, ln in enumerate(lines):
         # Línea de detalle principal (nº + EAN13 + resto)
-        if not re.match(r"^\d+\s+\d{13}\s", ln):
-            continue
-
-        parts = ln.split()
-
-        # Índices de tokens numéricos (nos sirven para localizar QTY y precios)
-        num_indices = [idx for idx, tok in enumerate(parts)
-                       if re.fullmatch(r"[\d.,]+", tok)]
-        if len(num_indices) < 6:
-            continue
-
         # Patrón: ... DESCRIPCION QTY 1 P_BRUTO P_NETO PVP NETO_LINEA
-        qty_idx = num_indices[-6]
-        p_bruto_idx = num_indices[-4]
-
-        qty = parts[qty_idx]
-        p_bruto_raw = parts[p_bruto_idx]
+        m = DETAIL_FIELDS_RE.match(ln)
+        if not m:
+            continue
 
-        # Normalizamos precio: 53,000 → 53.000
-        precio = p_bruto_raw.replace(".", "").replace(",", ".")
+        qty = m.group("qty")
+        p_bruto_raw = m.group("pbruto")
 
         # Descripción: después de los 3 códigos (serie + ref + colorcode)
-        desc_tokens = parts[5:qty_idx]
+        desc_tokens = m.group("mid").split()[3:]
         descripcion = " ".join(desc_tokens)
 
         # Línea siguiente puede ser segunda parte de la descripción (PUNTO ASIM FALDA)
         extra_desc = ""
         if i + 1 < len(lines):
             next_ln = lines[i + 1]
-            if (not re.match(r"^\d+\s+\d{13}\s", next_ln)
-                and not re.match(r"^[A-Z0-9]{5,}\s+\d{3}\s", next_ln)
-                and "WOMAN FIESTA" not in next_ln):
-                extra_desc = next_ln.strip()
+            if not ITEM_LINE_RE.match(next_ln) and "WOMAN FIESTA" not in next_ln:
+                extra_desc = next_ln  # ya viene sin espacios
 
         if extra_desc:
             descripcion = f"{descripcion} {extra_desc}"
@@ -220,48 +340,63 @@ def parse_page_eci(text: str):
             info_parts = info_ln.split()
 
             # Formato visto: 47D262G 983 PRINT NEGRO003 3
-            if len(info_parts) >= 3 and re.fullmatch(r"[A-Z0-9]+", info_parts[0]):
+            if len(info_parts) >= 3 and not info_parts[0].strip(MODEL_CODE_CHARS):
                 modelo = info_parts[0]
                 color_code = info_parts[1] if len(info_parts) >= 2 else ""
                 color_name1 = info_parts[2] if len(info_parts) >= 3 else ""
                 color_name2 = ""
                 if len(info_parts) >= 4:
-                    color_name2 = re.sub(r"\d+$", "", info_parts[3])
+                    color_name2 = info_parts[3].rstrip("0123456789")
                 color = " ".join([p for p in [color_code, color_name1, color_name2] if p])
 
-        rows.append({
-            "TIPO": tipo,
-            "N_PEDIDO": n_pedido,
-            "DEPARTAMENTO": departamento,
-            "DESCRIPCION": descripcion,
-            "MODELO": modelo,
-            "COLOR": color,
-            "PRECIO": precio,
-            "FECHA_ENTREGA": fecha_entrega,
-            "SUC_ENTREGA": suc_entrega,
-            "TOTAL_UNIDADES": qty,
-        })
+        descripciones.append(descripcion)
+        modelos.append(modelo)
+        colores.append(color)
+        precios.append(p_bruto_raw)
+        unidades.append(qty)
 
-    return rows
+    # Campos de cabecera, comunes a todas las filas de la página
+    n = len(modelos)
+    return {
+        "TIPO": [tipo] * n,
+        "N_PEDIDO": [n_pedido] * n,
+        "DEPARTAMENTO": [departamento] * n,
+        "FECHA_ENTREGA": [fecha_entrega] * n,
+        "SUC_ENTREGA": [suc_entrega] * n,
+        "DESCRIPCION": descripciones,
+        "MODELO": modelos,
+        "COLOR": colores,
+        "PRECIO": precios,
+        "TOTAL_UNIDADES": unidades,
+    }
 
 
+@st.cache_data(show_spinner=False, max_entries=8)
 def parse_pdf_eci_bytes(pdf_bytes: bytes) -> pd.DataFrame:
     """
     Abre un PDF de ECI (bytes) y devuelve un DataFrame con:
     - 1 fila por (PEDIDO + MODELO + COLOR)
     - TOTAL_UNIDADES: suma por modelo/color/pedido
     """
-    all_rows = []
+    # Acumulamos por columnas y construimos el DataFrame una sola vez
+    columns = {col: [] for col in ECI_COLUMNS}
 
-    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text() or ""
-            all_rows.extend(parse_page_eci(text))
+    for text in iter_pages_text(pdf_bytes):
+        # Portadas, avisos legales... sin pedido: ni las parseamos
+        if "Nº Pedido" not in text:
+            continue
+        for col, values in parse_page_eci(text).items():
+            columns[col].extend(values)
 
-    if not all_rows:
+    if not columns["N_PEDIDO"]:
         return pd.DataFrame()
 
-    df = pd.DataFrame(all_rows)
+    df = pd.DataFrame(columns)
+    df["PRECIO"] = (
+        df["PRECIO"]
+        .str.replace(".", "", regex=False)
+        .str.replace(",", ".", regex=False)
+    )
     df["TOTAL_UNIDADES"] = pd.to_numeric(
         df["TOTAL_UNIDADES"], errors="coerce"
     ).fillna(0).astype(int)
@@ -278,14 +413,63 @@ def parse_pdf_eci_bytes(pdf_bytes: bytes) -> pd.DataFrame:
         "SUC_ENTREGA",
     ]
 
+    for col in CATEGORY_COLS:
+        df[col] = df[col].astype("category")
+
     df_grouped = (
-        df.groupby(group_cols, as_index=False)["TOTAL_UNIDADES"]
+        df.groupby(group_cols, as_index=False, observed=True)["TOTAL_UNIDADES"]
           .sum()
     )
 
     return df_grouped
 
 
+# ============= RESÚMENES =============
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_resumen_eurofiel(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resumen Eurofiel por MODELO: nº de pedidos y unidades totales.
+    """
+    return (
+        df.groupby("MODELO", dropna=False)
+        .agg(
+            PEDIDOS=("PEDIDO", "nunique"),
+            UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+        )
+        .reset_index()
+        .sort_values("PEDIDOS", ascending=False)
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_resumen_eci(df: pd.DataFrame):
+    """
+    Resúmenes ECI: (por MODELO + COLOR, por MODELO).
+    """
+    resumen_mc = (
+        df.groupby(["MODELO", "COLOR"], dropna=False)
+        .agg(
+            PEDIDOS=("N_PEDIDO", "nunique"),
+            UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+        )
+        .reset_index()
+        .sort_values("PEDIDOS", ascending=False)
+    )
+
+    resumen_m = (
+        df.groupby("MODELO", dropna=False)
+        .agg(
+            PEDIDOS=("N_PEDIDO", "nunique"),
+            UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+        )
+        .reset_index()
+        .sort_values("PEDIDOS", ascending=False)
+    )
+
+    return resumen_mc, resumen_m
+
+
 # ============= UTILIDADES COMUNES (COLORES + BORDES + TOTALES) =============
 
 PALETTE = [
@@ -306,8 +490,22 @@ PALETTE = [
     "#ffafcc",
 ]
 
+# Estilos del Excel exportado
+THIN_BORDER = Border(
+    top=Side(border_style="thin", color="000000"),
+    left=Side(border_style="thin", color="000000"),
+    right=Side(border_style="thin", color="000000"),
+    bottom=Side(border_style="thin", color="000000"),
+)
+HEADER_STYLE = "ediwin_cabecera"
+TOTAL_STYLE = "ediwin_total"
+BODY_STYLE = "ediwin_cuerpo"
+
 
-def style_by_model(df: pd.DataFrame):
+def build_model_colors(df: pd.DataFrame) -> dict:
+    """
+    Asigna a cada MODELO un color de la paleta (MODELO → "#rrggbb").
+    """
     modelos = df["MODELO"].fillna("").astype(str).unique()
     model_colors = {}
     for i, m in enumerate(modelos):
@@ -315,53 +513,103 @@ def style_by_model(df: pd.DataFrame):
             continue
         color = PALETTE[i % len(PALETTE)]
         model_colors[m] = color
+    return model_colors
 
-    def color_rows(row):
-        color = model_colors.get(str(row["MODELO"]), "")
-        if not color:
-            return [""] * len(row)
-        return [f"background-color: {color}"] * len(row)
 
-    return df.style.apply(color_rows, axis=1)
+def style_by_model(df: pd.DataFrame, model_colors: dict):
+    # CSS de cada fila calculado de una vez sobre la columna MODELO,
+    # en vez de llamar a una función Python por fila
+    # Sin ningún color (todos los MODELO vacíos) map devuelve float64:
+    # se rellenan los huecos antes de concatenar
+    colors = df["MODELO"].astype(str).map(model_colors).fillna("").astype(str)
+    row_css = ("background-color: " + colors).where(colors != "", "")
+    css = pd.DataFrame({col: row_css for col in df.columns}, index=df.index)
 
+    return df.style.apply(lambda _: css, axis=None)
 
-def style_workbook_with_borders_and_headers(workbook):
+
+def model_style_name(color: str) -> str:
+    return f"ediwin_modelo_{color.lstrip('#')}"
+
+
+def register_named_styles(workbook, colors=()):
     """
-    Aplica:
-    - Bordes finos a todas las celdas
+    Registra en el libro los estilos con nombre: cabecera, TOTAL, cuerpo
+    y uno por cada color de MODELO. Asignar un estilo con nombre es una
+    sola operación por celda (en vez de fill + font + border por separado).
+    """
+    styles = [
+        NamedStyle(
+            name=HEADER_STYLE,
+            fill=PatternFill("solid", fgColor="FFFF00"),  # amarillo fuerte
+            font=Font(bold=True),
+            border=THIN_BORDER,
+        ),
+        NamedStyle(
+            name=TOTAL_STYLE,
+            fill=PatternFill("solid", fgColor="FFFF00"),
+            font=Font(bold=True),
+            border=THIN_BORDER,
+        ),
+        NamedStyle(name=BODY_STYLE, border=THIN_BORDER),
+    ]
+    for color in colors:
+        styles.append(NamedStyle(
+            name=model_style_name(color),
+            fill=PatternFill("solid", fgColor=color.lstrip("#").upper()),
+            border=THIN_BORDER,
+        ))
+
+    for style in styles:
+        if style.name not in workbook.named_styles:
+            workbook.add_named_style(style)
+
+
+def write_sheet(workbook, title: str, df: pd.DataFrame, model_colors=None):
+    """
+    Vuelca un DataFrame en una hoja nueva de un libro write_only.
+    Cada celda se crea ya con su estilo:
     - Cabeceras en amarillo chillón + negrita (fila 1)
     - Filas cuyo primer valor sea 'TOTAL' → amarillo + negrita
+    - Resto con bordes finos y, si se pasa model_colors, color por MODELO
+    """
+    ws = workbook.create_sheet(title)
+
+    def cell(value, style):
+        c = WriteOnlyCell(ws, value=None if pd.isna(value) else value)
+        c.style = style
+        return c
+
+    ws.append([cell(col, HEADER_STYLE) for col in df.columns])
+
+    modelo_idx = df.columns.get_loc("MODELO") if model_colors else None
+
+    for values in df.itertuples(index=False, name=None):
+        if str(values[0]).strip().upper() == "TOTAL":
+            style = TOTAL_STYLE
+        elif modelo_idx is not None and str(values[modelo_idx]) in model_colors:
+            style = model_style_name(model_colors[str(values[modelo_idx])])
+        else:
+            style = BODY_STYLE
+        ws.append([cell(v, style) for v in values])
+
+
+def build_excel(sheets) -> bytes:
+    """
+    Genera el Excel a partir de [(nombre_hoja, df, model_colors), ...].
+    Usa un libro write_only: las filas se escriben en streaming con su
+    estilo, sin cargar el libro entero en memoria ni repasarlo después.
     """
-    thin = Side(border_style="thin", color="000000")
-    border = Border(top=thin, left=thin, right=thin, bottom=thin)
-
-    header_fill = PatternFill("solid", fgColor="FFFF00")  # amarillo fuerte
-    header_font = Font(bold=True)
-
-    total_fill = PatternFill("solid", fgColor="FFFF00")
-    total_font = Font(bold=True)
-
-    for ws in workbook.worksheets:
-        max_row = ws.max_row
-        max_col = ws.max_column
-
-        # Bordes + cabecera
-        for row in ws.iter_rows(min_row=1, max_row=max_row,
-                                min_col=1, max_col=max_col):
-            for cell in row:
-                cell.border = border
-                if cell.row == 1:
-                    cell.fill = header_fill
-                    cell.font = header_font
-
-        # Totales (fila con primera celda == 'TOTAL')
-        for row_idx in range(2, max_row + 1):
-            first_cell = ws.cell(row=row_idx, column=1)
-            if str(first_cell.value).strip().upper() == "TOTAL":
-                for col_idx in range(1, max_col + 1):
-                    c = ws.cell(row=row_idx, column=col_idx)
-                    c.fill = total_fill
-                    c.font = total_font
+    wb = Workbook(write_only=True)
+    colors = {c for _, _, mc in sheets if mc for c in mc.values()}
+    register_named_styles(wb, sorted(colors))
+
+    for title, df, model_colors in sheets:
+        write_sheet(wb, title, df, model_colors)
+
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
 
 
 # ============= STREAMLIT APP =============
@@ -398,23 +646,17 @@ if uploaded_pdf is not None:
                     df["TOTAL_UNIDADES"], errors="coerce"
                 ).fillna(0)
 
-            # Estilos por MODELO
-            styled_df = style_by_model(df)
+            # Colores por MODELO: se calculan una vez y sirven tanto
+            # para la vista previa como para el Excel
+            model_colors = build_model_colors(df)
+            styled_df = style_by_model(df, model_colors)
             st.dataframe(styled_df, use_container_width=True)
 
             # ====== RESÚMENES Y EXPORT ======
             if cliente == "Eurofiel":
                 st.subheader("📦 Resumen por MODELO")
 
-                resumen = (
-                    df.groupby("MODELO", dropna=False)
-                    .agg(
-                        PEDIDOS=("PEDIDO", "nunique"),
-                        UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
-                    )
-                    .reset_index()
-                    .sort_values("PEDIDOS", ascending=False)
-                )
+                resumen = build_resumen_eurofiel(df)
 
                 st.dataframe(resumen, use_container_width=True)
 
@@ -422,26 +664,20 @@ if uploaded_pdf is not None:
                 resumen_xlsx = resumen.copy()
                 total_row = {
                     "MODELO": "TOTAL",
-                    "PEDIDOS": resumen_xlsx["PEDIDOS"].sum(),
+                    "PEDIDOS": int(resumen_xlsx["PEDIDOS"].sum()),
                     "UNIDADES_TOTALES": resumen_xlsx["UNIDADES_TOTALES"].sum(),
                 }
-                resumen_xlsx = pd.concat(
-                    [resumen_xlsx, pd.DataFrame([total_row])],
-                    ignore_index=True,
-                )
+                resumen_xlsx.loc[len(resumen_xlsx)] = total_row
 
                 # ---- Exportar Excel Eurofiel ----
-                excel_buffer = BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                    styled_df.to_excel(writer, sheet_name="Pedidos", index=False)
-                    resumen_xlsx.to_excel(writer, sheet_name="Resumen por modelo", index=False)
-
-                    wb = writer.book
-                    style_workbook_with_borders_and_headers(wb)
+                excel_bytes = build_excel([
+                    ("Pedidos", df, model_colors),
+                    ("Resumen por modelo", resumen_xlsx, None),
+                ])
 
                 st.download_button(
                     label="⬇️ Descargar Excel",
-                    data=excel_buffer.getvalue(),
+                    data=excel_bytes,
                     file_name="eurofiel_resumen_pedidos.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 )
@@ -458,30 +694,12 @@ if uploaded_pdf is not None:
             else:  # El Corte Inglés
                 st.subheader("📦 Resumen por MODELO + COLOR")
 
-                resumen_mc = (
-                    df.groupby(["MODELO", "COLOR"], dropna=False)
-                    .agg(
-                        PEDIDOS=("N_PEDIDO", "nunique"),
-                        UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
-                    )
-                    .reset_index()
-                    .sort_values("PEDIDOS", ascending=False)
-                )
+                resumen_mc, resumen_m = build_resumen_eci(df)
 
                 st.dataframe(resumen_mc, use_container_width=True)
 
                 st.subheader("🧩 Resumen por MODELO (todas las sucursales/colores)")
 
-                resumen_m = (
-                    df.groupby("MODELO", dropna=False)
-                    .agg(
-                        PEDIDOS=("N_PEDIDO", "nunique"),
-                        UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
-                    )
-                    .reset_index()
-                    .sort_values("PEDIDOS", ascending=False)
-                )
-
                 st.dataframe(resumen_m, use_container_width=True)
 
                 # --- versiones para Excel con fila TOTAL ---
@@ -489,38 +707,29 @@ if uploaded_pdf is not None:
                 total_mc = {
                     "MODELO": "TOTAL",
                     "COLOR": "",
-                    "PEDIDOS": resumen_mc_xlsx["PEDIDOS"].sum(),
+                    "PEDIDOS": int(resumen_mc_xlsx["PEDIDOS"].sum()),
                     "UNIDADES_TOTALES": resumen_mc_xlsx["UNIDADES_TOTALES"].sum(),
                 }
-                resumen_mc_xlsx = pd.concat(
-                    [resumen_mc_xlsx, pd.DataFrame([total_mc])],
-                    ignore_index=True,
-                )
+                resumen_mc_xlsx.loc[len(resumen_mc_xlsx)] = total_mc
 
                 resumen_m_xlsx = resumen_m.copy()
                 total_m = {
                     "MODELO": "TOTAL",
-                    "PEDIDOS": resumen_m_xlsx["PEDIDOS"].sum(),
+                    "PEDIDOS": int(resumen_m_xlsx["PEDIDOS"].sum()),
                     "UNIDADES_TOTALES": resumen_m_xlsx["UNIDADES_TOTALES"].sum(),
                 }
-                resumen_m_xlsx = pd.concat(
-                    [resumen_m_xlsx, pd.DataFrame([total_m])],
-                    ignore_index=True,
-                )
+                resumen_m_xlsx.loc[len(resumen_m_xlsx)] = total_m
 
                 # ---- Exportar Excel ECI ----
-                excel_buffer = BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                    styled_df.to_excel(writer, sheet_name="Pedidos", index=False)
-                    resumen_mc_xlsx.to_excel(writer, sheet_name="Resumen modelo+color", index=False)
-                    resumen_m_xlsx.to_excel(writer, sheet_name="Resumen modelo", index=False)
-
-                    wb = writer.book
-                    style_workbook_with_borders_and_headers(wb)
+                excel_bytes = build_excel([
+                    ("Pedidos", df, model_colors),
+                    ("Resumen modelo+color", resumen_mc_xlsx, None),
+                    ("Resumen modelo", resumen_m_xlsx, None),
+                ])
 
                 st.download_button(
                     label="⬇️ Descargar Excel",
-                    data=excel_buffer.getvalue(),
+                    data=excel_bytes,
                     file_name="eci_resumen_pedidos.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 )
@@ -1,5 +1,10 @@
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
 from pathlib import Path
+from typing import List, Optional, Tuple, Union
 import argparse
 
 import pdfplumber
@@ -8,78 +13,121 @@ import pandas as pd
 
 # ============= PARSER ECI =============
 
+# Cabecera de página
+# TIPO: línea que es solo "Pedido", "Reposición" o "Anulación Pedido"
+TIPO_RE = re.compile(
+    r"^[^\S\n]*(pedido|reposici[oó]n|anulaci[oó]n pedido)[^\S\n]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+PEDIDO_RE = re.compile(r"Nº Pedido\s+(\d+)")
+DEPARTAMENTO_RE = re.compile(r"Dpto\. venta\s+(\d+)")
+FECHA_ENTREGA_RE = re.compile(r"Fecha Entrega\s+(\d{2}/\d{2}/\d{4})")
+SUC_DESTINO_RE = re.compile(r"Sucursal Destino que Pide\s+([0-9 ]+)\s+[A-ZÁÉÍÓÚÜÑ]")
+SUC_ENTREGA_RE = re.compile(r"Sucursal de Entrega\s+([0-9 ]+)\s+[A-ZÁÉÍÓÚÜÑ]")
+
+# Líneas de detalle
+# Línea de detalle (nº + EAN13 + resto) o de modelo/color (47D262G 983 ...)
+ITEM_LINE_RE = re.compile(r"^(?:\d+\s+\d{13}|[A-Z0-9]{5,}\s+\d{3})\s")
+# ... DESCRIPCION QTY 1 P_BRUTO P_NETO PVP NETO_LINEA: los 6 últimos tokens
+# numéricos, aunque haya palabras entre ellos o detrás (p.ej. "9,00 EUR 19,95").
+# Cada palabra se parte de una sola forma ([\d.,]* hasta su primer carácter
+# no numérico): con \S*[^\d.,\s]\S* una línea que no casa hacía backtracking
+# exponencial en nº de palabras
+TEXT_TOKENS = r"(?:\s+[\d.,]*[^\d.,\s]\S*)*"
+DETAIL_FIELDS_RE = re.compile(
+    r"^\d+\s+\d{13}(?=\s)(?P<mid>.*?)"
+    rf"\s+(?P<qty>[\d.,]+){TEXT_TOKENS}\s+[\d.,]+{TEXT_TOKENS}\s+(?P<pbruto>[\d.,]+)"
+    rf"(?:{TEXT_TOKENS}\s+[\d.,]+){{3}}{TEXT_TOKENS}\s*$"
+)
+# Caracteres de un código de modelo (47D262G): comprobar con strip() es
+# mucho más barato que un fullmatch de regex por token
+MODEL_CODE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+# Columnas que devuelve parse_page_eci, en orden
+ECI_COLUMNS = [
+    "TIPO",
+    "N_PEDIDO",
+    "DEPARTAMENTO",
+    "FECHA_ENTREGA",
+    "SUC_ENTREGA",
+    "DESCRIPCION",
+    "MODELO",
+    "COLOR",
+    "PRECIO",
+    "TOTAL_UNIDADES",
+]
+
+# Columnas que se repiten en muchas filas (cabecera de página, pedido y
+# precio): como category ocupan un código entero por fila
+CATEGORY_COLS = [
+    "TIPO",
+    "N_PEDIDO",
+    "DEPARTAMENTO",
+    "FECHA_ENTREGA",
+    "SUC_ENTREGA",
+    "PRECIO",
+]
+
+
 def parse_page_eci(text: str):
     """
     Parsea una página de pedido de ECI.
-    Devuelve una lista de dicts, una fila por (pedido, modelo, color).
+    Devuelve un dict columna → lista de valores (ECI_COLUMNS),
+    con una posición por (pedido, modelo, color).
     """
 
     # Limpiamos líneas
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    lines = [ln for ln in map(str.strip, text.splitlines()) if ln]
 
-    def search(pattern: str):
-        m = re.search(pattern, text)
+    def search(pattern: re.Pattern):
+        m = pattern.search(text)
         return m.group(1).strip() if m else ""
 
     # TIPO: Pedido / Reposición / Anulación Pedido...
-    tipo = ""
-    for ln in lines:
-        low = ln.lower()
-        if low in ("pedido", "reposicion", "reposición", "anulacion pedido", "anulación pedido"):
-            tipo = ln.upper()
-            break
+    m_tipo = TIPO_RE.search(text)
+    tipo = m_tipo.group(1).upper() if m_tipo else ""
 
     # Cabecera
-    n_pedido = search(r"Nº Pedido\s+(\d+)")
-    departamento = search(r"Dpto\. venta\s+(\d+)")
-    fecha_entrega = search(r"Fecha Entrega\s+(\d{2}/\d{2}/\d{4})")
+    n_pedido = search(PEDIDO_RE)
+    departamento = search(DEPARTAMENTO_RE)
+    fecha_entrega = search(FECHA_ENTREGA_RE)
 
     # Sucursal entrega (01 0050, 02 0062, etc.)
-    suc_entrega = search(r"Sucursal Destino que Pide\s+([0-9 ]+)\s+[A-ZÁÉÍÓÚÜÑ]")
+    suc_entrega = search(SUC_DESTINO_RE)
     if not suc_entrega:
-        suc_entrega = search(r"Sucursal de Entrega\s+([0-9 ]+)\s+[A-ZÁÉÍÓÚÜÑ]")
+        suc_entrega = search(SUC_ENTREGA_RE)
 
-    rows = []
+    # Columnas de detalle: una lista por campo
+    descripciones = []
+    modelos = []
+    colores = []
+    precios = []
+    unidades = []
 
     for i, ln in enumerate(lines):
         # Línea de detalle principal (nº + EAN13 + resto)
-        if not re.match(r"^\d+\s+\d{13}\s", ln):
-            continue
-
-        parts = ln.split()
-
-        # Índices de tokens numéricos (nos sirven para localizar QTY y precios)
-        num_indices = [idx for idx, tok in enumerate(parts)
-                       if re.fullmatch(r"[\d.,]+", tok)]
-        if len(num_indices) < 6:
-            # Si no hay suficientes números, pasamos
-            continue
-
         # Patrón: ... DESCRIPCION QTY 1 P_BRUTO P_NETO PVP NETO_LINEA
         # → los últimos 4 números son precios
         # → antes hay un "1" (factor) y antes la cantidad
-        qty_idx = num_indices[-6]
-        p_bruto_idx = num_indices[-4]
-
-        qty = parts[qty_idx]
-        p_bruto_raw = parts[p_bruto_idx]
+        m = DETAIL_FIELDS_RE.match(ln)
+        if not m:
+            continue
 
-        # Normalizamos precio: 53,000 → 53.000
-        precio = p_bruto_raw.replace(".", "").replace(",", ".")
+        qty = m.group("qty")
+        p_bruto_raw = m.group("pbruto")
 
         # Descripción: después de los 3 códigos (serie + ref + colorcode)
         # Formato visto: 1 EAN SERIE REF COLORCODE DESCRIPCION... QTY ...
-        desc_tokens = parts[5:qty_idx]
+        desc_tokens = m.group("mid").split()[3:]
         descripcion = " ".join(desc_tokens)
 
         # Línea siguiente puede ser segunda parte de la descripción (PUNTO ASIM FALDA)
         extra_desc = ""
         if i + 1 < len(lines):
             next_ln = lines[i + 1]
-            if (not re.match(r"^\d+\s+\d{13}\s", next_ln)     # no es otra cabecera
-                and not re.match(r"^[A-Z0-9]{5,}\s+\d{3}\s", next_ln)  # no es línea de modelo/color
-                and "WOMAN FIESTA" not in next_ln):
-                extra_desc = next_ln.strip()
+            # no es otra línea de detalle ni de modelo/color
+            if not ITEM_LINE_RE.match(next_ln) and "WOMAN FIESTA" not in next_ln:
+                extra_desc = next_ln  # ya viene sin espacios
 
         if extra_desc:
             descripcion = f"{descripcion} {extra_desc}"
@@ -95,49 +143,131 @@ def parse_page_eci(text: str):
             info_parts = info_ln.split()
 
             # Formato visto: 47D262G 983 PRINT NEGRO003 3
-            if len(info_parts) >= 3 and re.fullmatch(r"[A-Z0-9]+", info_parts[0]):
+            if len(info_parts) >= 3 and not info_parts[0].strip(MODEL_CODE_CHARS):
                 modelo = info_parts[0]
                 color_code = info_parts[1] if len(info_parts) >= 2 else ""
                 color_name1 = info_parts[2] if len(info_parts) >= 3 else ""
                 color_name2 = ""
                 if len(info_parts) >= 4:
                     # NEGRO003 → NEGRO
-                    color_name2 = re.sub(r"\d+$", "", info_parts[3])
+                    color_name2 = info_parts[3].rstrip("0123456789")
                 color = " ".join([p for p in [color_code, color_name1, color_name2] if p])
 
-        rows.append({
-            "TIPO": tipo,                         # PEDIDO / REPOSICION / ANULACION...
-            "N_PEDIDO": n_pedido,                 # 74245201
-            "DEPARTAMENTO": departamento,         # 0056
-            "DESCRIPCION": descripcion,           # VEST LARGO... PUNTO ASIM FALDA
-            "MODELO": modelo,                     # 47D262G
-            "COLOR": color,                       # 983 PRINT NEGRO
-            "PRECIO": precio,                     # 53.000 (P. Bruto)
-            "FECHA_ENTREGA": fecha_entrega,       # 06/02/2025
-            "SUC_ENTREGA": suc_entrega,           # 01 0050 / 02 0062...
-            "TOTAL_UNIDADES": qty,                # 134 / 125 / 34 / 31...
-        })
+        descripciones.append(descripcion)     # VEST LARGO... PUNTO ASIM FALDA
+        modelos.append(modelo)                # 47D262G
+        colores.append(color)                 # 983 PRINT NEGRO
+        precios.append(p_bruto_raw)           # 53,000 (P. Bruto, sin normalizar)
+        unidades.append(qty)                  # 134 / 125 / 34 / 31...
+
+    # Los campos de cabecera son los mismos para todas las filas de la página
+    n = len(modelos)
+    return {
+        "TIPO": [tipo] * n,                   # PEDIDO / REPOSICION / ANULACION...
+        "N_PEDIDO": [n_pedido] * n,           # 74245201
+        "DEPARTAMENTO": [departamento] * n,   # 0056
+        "FECHA_ENTREGA": [fecha_entrega] * n, # 06/02/2025
+        "SUC_ENTREGA": [suc_entrega] * n,     # 01 0050 / 02 0062...
+        "DESCRIPCION": descripciones,
+        "MODELO": modelos,
+        "COLOR": colores,
+        "PRECIO": precios,
+        "TOTAL_UNIDADES": unidades,
+    }
+
+
+def page_ranges(n_pages: int, n_chunks: int) -> List[Tuple[int, int]]:
+    """
+    Reparte las páginas 1..n_pages en n_chunks tramos contiguos (first, last),
+    uno por proceso. Cada pdfplumber.open recorre el documento entero, así
+    que abrir el PDF una vez por tramo (y no por página) evita que el coste
+    crezca con el cuadrado del nº de páginas. También lo usan
+    eurofiel_parser y la app.
+    """
+    size, extra = divmod(n_pages, n_chunks)
+    ranges = []
+    first = 1
+    for i in range(n_chunks):
+        last = first + size - 1 + (i < extra)
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
 
-    return rows
+
+def _extract_pages_text(pdf_source: Union[str, bytes], page_range: Tuple[int, int]) -> List[str]:
+    """
+    Texto de las páginas first..last (numeradas desde 1), abriendo el PDF
+    una sola vez para todo el tramo. Se ejecuta en un proceso aparte;
+    `pdf_source` es una ruta o los bytes del PDF (subido a la app).
+    """
+    first, last = page_range
+    if isinstance(pdf_source, bytes):
+        pdf_source = BytesIO(pdf_source)
+    with pdfplumber.open(pdf_source, pages=list(range(first, last + 1))) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
 
 
-def parse_pdf_eci(pdf_path: Path) -> pd.DataFrame:
+def _extract_and_parse_pages(pdf_path: str, page_range: Tuple[int, int]):
+    """
+    Extrae y parsea las páginas first..last (numeradas desde 1) en un
+    proceso aparte. Las páginas sin pedido ni se parsean.
+    """
+    return [
+        parse_page_eci(text)
+        for text in _extract_pages_text(pdf_path, page_range)
+        if "Nº Pedido" in text
+    ]
+
+
+def parse_pdf_eci(pdf_path: Path, workers: Optional[int] = None) -> pd.DataFrame:
     """
     Abre un PDF de ECI y devuelve un DataFrame con:
     - 1 fila por (PEDIDO + MODELO + COLOR)
     - TOTAL_UNIDADES: suma por modelo/color/pedido
+
+    Las páginas se reparten en tramos contiguos entre `workers` procesos
+    (por defecto, uno por núcleo). Con workers=1 se procesan en serie.
     """
-    all_rows = []
+    # Acumulamos por columnas y construimos el DataFrame una sola vez
+    columns = {col: [] for col in ECI_COLUMNS}
 
-    with pdfplumber.open(str(pdf_path)) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text() or ""
-            all_rows.extend(parse_page_eci(text))
+    def add_page(page_columns):
+        for col, values in page_columns.items():
+            columns[col].extend(values)
 
-    if not all_rows:
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        n_pages = len(pdf.pages)
+        workers = workers or os.cpu_count() or 1
+        parallel = workers > 1 and n_pages > 1
+        if not parallel:
+            for page in pdf.pages:
+                text = page.extract_text() or ""
+                # Portadas, avisos legales... sin pedido: ni las parseamos
+                if "Nº Pedido" not in text:
+                    continue
+                add_page(parse_page_eci(text))
+
+    if parallel:
+        # Cada página es independiente y extract_text es CPU puro:
+        # repartimos tramos de páginas entre procesos (con hilos el GIL no
+        # escala), uno por proceso para abrir el PDF una vez en cada uno
+        extract = partial(_extract_and_parse_pages, str(pdf_path))
+        ranges = page_ranges(n_pages, min(workers, n_pages))
+        with ProcessPoolExecutor(max_workers=len(ranges)) as ex:
+            for pages_columns in ex.map(extract, ranges):
+                for page_columns in pages_columns:
+                    add_page(page_columns)
+
+    if not columns["N_PEDIDO"]:
         return pd.DataFrame()
 
-    df = pd.DataFrame(all_rows)
+    df = pd.DataFrame(columns)
+
+    # Normalizamos precio (vectorizado): 53,000 → 53.000
+    df["PRECIO"] = (
+        df["PRECIO"]
+        .str.replace(".", "", regex=False)
+        .str.replace(",", ".", regex=False)
+    )
 
     # Total unidades como número
     df["TOTAL_UNIDADES"] = pd.to_numeric(df["TOTAL_UNIDADES"],
@@ -156,8 +286,13 @@ def parse_pdf_eci(pdf_path: Path) -> pd.DataFrame:
         "SUC_ENTREGA",
     ]
 
+    # Columnas de cabecera con pocos valores distintos → category,
+    # así el groupby agrupa por códigos enteros en vez de por strings
+    for col in CATEGORY_COLS:
+        df[col] = df[col].astype("category")
+
     df_grouped = (
-        df.groupby(group_cols, as_index=False)["TOTAL_UNIDADES"]
+        df.groupby(group_cols, as_index=False, observed=True)["TOTAL_UNIDADES"]
           .sum()
     )
 
@@ -180,6 +315,12 @@ def main():
         required=True,
         help="Ruta de salida para el Excel (por ejemplo, output/eci_resumen.xlsx)."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Nº de procesos para leer las páginas (por defecto, uno por núcleo; 1 = en serie)."
+    )
 
     args = parser.parse_args()
 
@@ -187,7 +328,7 @@ def main():
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    df = parse_pdf_eci(pdf_path)
+    df = parse_pdf_eci(pdf_path, workers=args.workers)
 
     if df.empty:
         print("⚠ No se han detectado líneas de pedido en el PDF ECI.")
@@ -0,0 +1,44 @@
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from eci_parser import parse_page_eci  # noqa: E402
+from eurofiel_resumen_pedidos import parse_detail_line, strip_size  # noqa: E402
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("3RC240/NARANJA/XS", "3RC240/NARANJA"),
+    ("2TB060/AZUL OSCUR/S", "2TB060/AZUL OSCUR"),
+    ("0863769/66/01", "0863769/66"),
+    ("SINBARRA", "SINBARRA"),
+    # Barra final: re.sub(r"/[^/]+$") no la toca (rsplit sí la quitaba)
+    ("A/B/", "A/B/"),
+    ("/XS", ""),
+])
+def test_strip_size(code, expected):
+    assert strip_size(code) == expected
+    assert strip_size(code) == re.sub(r"/[^/]+$", "", code)
+
+
+def test_detail_line_model_and_pattern_without_size():
+    row = parse_detail_line(
+        "1 8447571299747 3RC240/NARANJA/XS 0863769/66/01 1 50 50 0 EUR"
+    )
+    assert row[:2] == ("3RC240/NARANJA", "0863769/66")
+
+
+def test_color_name_drops_trailing_digits():
+    # NEGRO003 → NEGRO
+    text = (
+        "Pedido\n"
+        "Nº Pedido 74245201\n"
+        "1 8447571299747 123 456 789 VESTIDO LARGO 134 1 53,000 50,000 99,95 6700,00\n"
+        "47D262G 983 PRINT NEGRO003 3\n"
+    )
+    page = parse_page_eci(text)
+    assert page["MODELO"] == ["47D262G"]
+    assert page["COLOR"] == ["983 PRINT NEGRO"]
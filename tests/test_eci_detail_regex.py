@@ -0,0 +1,44 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from eci_parser import DETAIL_FIELDS_RE  # noqa: E402
+
+DETAIL = "1 8447571299747 123 456 789 CAMISETA M/C 2 1 10,00 9,00 19,95 18,00"
+
+
+def test_detail_line_with_text_tail():
+    m = DETAIL_FIELDS_RE.match(DETAIL + " UNIDADES X2 OK")
+    assert m
+    assert m.group("qty") == "2"
+    assert m.group("pbruto") == "10,00"
+    assert m.group("mid").split() == ["123", "456", "789", "CAMISETA", "M/C"]
+
+
+def test_detail_line_with_text_between_numbers():
+    # Como antes del regex: cuentan los 6 últimos tokens numéricos estén
+    # donde estén, no tienen que ir seguidos
+    m = DETAIL_FIELDS_RE.match(
+        "1 8447571299747 123 456 789 CAMISA 2 1 10,00 9,00 EUR 19,95 18,00"
+    )
+    assert m
+    assert m.group("qty") == "2"
+    assert m.group("pbruto") == "10,00"
+    assert m.group("mid").split()[3:] == ["CAMISA"]
+
+
+def test_ean_must_be_followed_by_space():
+    assert DETAIL_FIELDS_RE.match(DETAIL.replace("8447571299747", "84475712997471")) is None
+
+
+def test_long_text_run_without_six_numbers_fails_fast():
+    # Con palabras partibles de varias formas: ~8x más lento por palabra
+    # (7 palabras ≈ 3.5 s). Solo 5 números tras el EAN: no es de detalle
+    words = " ".join(["abcdefgh"] * 40)
+    ln = f"1 8447571299747 SERIE REF COLOR CAMISETA 2 {words} 1 10,00 9,00 5"
+    t0 = time.perf_counter()
+    m = DETAIL_FIELDS_RE.match(ln)
+    assert time.perf_counter() - t0 < 0.5
+    assert m is None
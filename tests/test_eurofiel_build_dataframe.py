@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from eurofiel_parser import TARGET_COLS, Header, Linea, build_dataframe  # noqa: E402
+
+
+def test_totals_per_order_with_missing_units_and_price():
+    header = Header(pedido="4500123", fecha="01/02/2025",
+                    fecha_entrega="15/02/2025", destino="ESPAÑA")
+    lineas = [
+        Linea(modelo="3RC240", patron="0863769", unidades=10, precio=2.5),
+        Linea(modelo="3RC240", patron="0863769", unidades=None, precio=3.0),
+        Linea(modelo="2TB060", patron="0832547", unidades=4, precio=None),
+    ]
+
+    df = build_dataframe(header, lineas, {})
+
+    assert list(df.columns) == TARGET_COLS
+    assert len(df) == 3
+    assert df["UNIDADES"].tolist() == [10, "", 4]
+    assert df["PRECIO"].tolist() == [2.5, 3.0, ""]
+    # Sin unidades o sin precio cuentan como 0
+    assert df["UNIDADES_TOTALES"].tolist() == [14, 14, 14]
+    assert df["IMPORTE_TOTAL"].tolist() == pytest.approx([25.0, 25.0, 25.0])
+    assert df["TIPO"].unique().tolist() == ["Pedido"]
+    assert df["PEDIDO"].unique().tolist() == ["4500123"]
+
+
+def test_no_lines_gives_empty_frame_with_target_columns():
+    df = build_dataframe(Header(), [], {})
+    assert df.empty
+    assert list(df.columns) == TARGET_COLS